@@ -1,8 +1,15 @@
 # engine.py
 
 import time
+import math
 import threading
-from midi_io import MIDIOutput
+import bisect
+from collections import deque
+from midi_io import (MIDIOutput, MIDIFanOut, MIDI_CLOCK_PPQN,
+                     CLOCK_MSG, START_MSG, STOP_MSG, song_position_msg)
+from track import refill_ca_rows
+from tracelog import (TraceRecorder, STATUS_NOTE_ON, STATUS_NOTE_OFF,
+                      STATUS_CLOCK, STATUS_START, STATUS_STOP, STATUS_SONGPOS)
 
 class SequencerEngine:
     def __init__(self, bpm=120, tracks=None, midi_output=None):
@@ -12,15 +19,59 @@ class SequencerEngine:
 
         self.playing = False
         self.sequencer_thread = None
-        self.clock_resolution = 100
+        self.clock_resolution = 100  # max sleeps per second while idle
+        # Sleep until this close to a deadline, then busy-wait the rest.
+        self.spin_margin = 0.001
+
+        # Clock master: when set, run() sends SPP+start, 24 PPQN clock and
+        # stop on these outputs. See set_clock_outputs().
+        self.clock_output = None
+
+        # Optional TraceRecorder: logs every emitted message with its
+        # intended and actual send time. See set_trace_file().
+        self.trace = None
+
+        # run() holds its own references to clock_output/trace for the whole
+        # run. Ones replaced meanwhile are parked here and closed when run()
+        # lets go of them, never underneath it.
+        self._io_lock = threading.Lock()
+        self._running = False
+        self._retired = []
 
         self.current_steps = {}
         for i,_ in enumerate(self.tracks):
             self.current_steps[i]=0
+        # generation each rule_based track is playing (ca_rows[gen-ca_base])
+        self.current_gens = {}
+        # poll() slides ca_rows windows forward as they're played through;
+        # turn off where another side owns the tracks (engine_process)
+        self.ca_refill = True
+
+        # The run loop only ever reads self.arrangement: a tuple of
+        # TrackSnapshots that editors replace wholesale via publish().
+        # Rebinding an attribute is atomic, so the loop needs no lock and
+        # never sees a half-edited list.
+        self._publish_lock = threading.Lock()
+        self.arrangement = ()
+        self.publish()
 
         # callback: on_step_callback(track_idx, step)
         self.on_step_callback = None
 
+        # Live recording: MIDIInput appends (timestamp, type, note, velocity)
+        # tuples from its callback thread. deque append/popleft are atomic,
+        # so neither side ever takes a lock.
+        self.record_queue = deque(maxlen=4096)
+        # Quantized notes waiting to be written into their Track:
+        # (track, step, note, velocity). Applied under the publish lock by
+        # poll(), or by the engine thread when the lock happens to be free.
+        self.recorded_takes = deque()
+        # optional take_listener(track_idx, step, note, velocity), called
+        # under the publish lock for every recorded note as it's applied
+        self.take_listener = None
+        self.record_track_idx = None
+        self.midi_input = None
+
     @property
     def bpm(self):
         return self._bpm
@@ -30,42 +81,194 @@ class SequencerEngine:
             new_bpm=1
         self._bpm=new_bpm
 
+    def publish(self, track_idx=None):
+        """
+        Build a new arrangement from self.tracks and swap it in. Call after
+        any edit to the tracks list or a track's steps/settings. With
+        track_idx only that track is re-frozen and the rest are reused.
+        """
+        with self._publish_lock:
+            self._publish_locked(track_idx)
+
+    def _publish_locked(self, track_idx=None):
+        old=self.arrangement
+        if (track_idx is not None and len(old)==len(self.tracks)
+                and 0<=track_idx<len(old) and old[track_idx].track is self.tracks[track_idx]):
+            arr=list(old)
+            arr[track_idx]=self.tracks[track_idx].snapshot()
+            self.arrangement=tuple(arr)
+        else:
+            self.arrangement=tuple(t.snapshot() for t in self.tracks)
+
+    def _apply_recorded_locked(self):
+        """
+        Write queued takes into their tracks and re-publish them. Caller
+        holds _publish_lock, so no snapshot is being taken meanwhile.
+        """
+        touched=set()
+        for _ in range(len(self.recorded_takes)):
+            try:
+                track, s_idx, note, vel = self.recorded_takes.popleft()
+            except IndexError:
+                break
+            if s_idx>=len(track.steps):
+                continue
+            step_data=track.steps[s_idx]
+            step_data["active"]=1
+            step_data["note"]=note
+            step_data["velocity"]=vel
+            # like a hand edit, a recorded note freezes the automaton
+            track.ca_rows=None
+            touched.add(track)
+            if self.take_listener:
+                for t_idx, tr in enumerate(self.tracks):
+                    if tr is track:
+                        self.take_listener(t_idx, s_idx, note, vel)
+                        break
+        for t_idx, tr in enumerate(self.tracks):
+            if tr in touched:
+                self._publish_locked(t_idx)
+
+    def apply_edit(self, track_idx, edit):
+        """
+        Run edit(track) and re-publish that track, all under the publish
+        lock, for editors on threads other than the engine's.
+        """
+        with self._publish_lock:
+            if 0<=track_idx<len(self.tracks):
+                edit(self.tracks[track_idx])
+                self._publish_locked(track_idx)
+
+    def poll(self):
+        """
+        Called periodically from the UI thread: hands any recorded takes
+        the engine thread couldn't apply itself to the editing side, and
+        computes more automaton generations for tracks that need them.
+        """
+        if self.recorded_takes:
+            with self._publish_lock:
+                self._apply_recorded_locked()
+        if self.ca_refill and self.playing:
+            refill_ca_rows(self.tracks, dict(self.current_gens), self.apply_edit)
+
     def add_track(self, track):
-        idx=len(self.tracks)
-        self.tracks.append(track)
-        self.current_steps[idx]=0
+        with self._publish_lock:
+            self.current_steps[len(self.tracks)]=0
+            self.tracks.append(track)
+            self._publish_locked()
+
+    def add_tracks(self, tracks):
+        """
+        Append several tracks with a single publish (e.g. a file import).
+        """
+        with self._publish_lock:
+            for track in tracks:
+                self.current_steps[len(self.tracks)]=0
+                self.tracks.append(track)
+            self._publish_locked()
 
     def remove_track(self, track_idx):
-        if 0<=track_idx<len(self.tracks):
-            del self.tracks[track_idx]
-            # re-build current_steps map
-            self.current_steps={}
-            for i,_ in enumerate(self.tracks):
-                self.current_steps[i]=0
+        with self._publish_lock:
+            if 0<=track_idx<len(self.tracks):
+                del self.tracks[track_idx]
+                if self.record_track_idx==track_idx:
+                    self.record_track_idx=None
+                elif self.record_track_idx is not None and self.record_track_idx>track_idx:
+                    self.record_track_idx-=1
+                self._publish_locked()
 
     def reorder_tracks(self, old_index, new_index):
         """
         Move track from old_index to new_index (drag & drop style).
         """
-        if old_index<0 or old_index>=len(self.tracks):
+        with self._publish_lock:
+            if old_index<0 or old_index>=len(self.tracks):
+                return
+            if new_index<0 or new_index>=len(self.tracks):
+                return
+            track=self.tracks.pop(old_index)
+            self.tracks.insert(new_index, track)
+            if self.record_track_idx is not None:
+                rec=self.record_track_idx
+                if rec==old_index:
+                    self.record_track_idx=new_index
+                elif old_index<rec<=new_index:
+                    self.record_track_idx=rec-1
+                elif new_index<=rec<old_index:
+                    self.record_track_idx=rec+1
+            self._publish_locked()
+
+    def arm_record(self, track_idx):
+        """
+        Route incoming MIDI notes into track_idx. Anything queued before
+        arming is discarded so stale notes don't land in the new take.
+        """
+        if track_idx is None or not (0<=track_idx<len(self.tracks)):
+            self.record_track_idx=None
             return
-        if new_index<0 or new_index>=len(self.tracks):
+        self.record_queue.clear()
+        self.record_track_idx=track_idx
+
+    def disarm_record(self):
+        self.record_track_idx=None
+
+    def merge_recorded(self, track, grid_times, boundary_time):
+        """
+        Quantize queued note events onto the cycle that just finished and
+        queue them as takes for track. Track.steps itself is only written
+        under the publish lock (see _apply_recorded_locked).
+
+        grid_times[s] is the monotonic time step s fired during that cycle,
+        boundary_time the time step 0 fired again. Each note-on snaps to the
+        nearest step; anything closer to the boundary wraps onto step 0.
+        Events older than the cycle's first step are dropped. Steps carry
+        no gate length, so note-offs are drained but not stored.
+        """
+        pending=len(self.record_queue)
+        if not pending:
             return
-        track=self.tracks.pop(old_index)
-        self.tracks.insert(new_index, track)
-        # re-build current_steps
-        cpy = {}
-        for i,_ in enumerate(self.tracks):
-            cpy[i]=0
-        self.current_steps=cpy
+        grid=list(grid_times)+[boundary_time]
+        n=len(grid_times)
+        for _ in range(pending):
+            try:
+                t, kind, note, vel = self.record_queue.popleft()
+            except IndexError:
+                break
+            if kind!="note_on" or vel==0 or t<grid[0]:
+                continue
+            pos=bisect.bisect_left(grid, t)
+            if pos<=0:
+                s_idx=0
+            elif pos>n:
+                s_idx=0
+            elif t-grid[pos-1] <= grid[pos]-t:
+                s_idx=pos-1
+            else:
+                s_idx=pos%n
+            self.recorded_takes.append((track, s_idx, note, vel))
+
+    def drop_recorded_before(self, cutoff):
+        """
+        Discard queued note events older than cutoff (a perf_counter time).
+        """
+        for _ in range(len(self.record_queue)):
+            try:
+                event=self.record_queue[0]
+            except IndexError:
+                break
+            if event[0]>=cutoff:
+                break
+            self.record_queue.popleft()
 
     def generate_all_tracks(self):
-        ref = self.tracks[0] if self.tracks else None
-        for t in self.tracks:
-            if t.algorithm=="counterpoint":
-                t.generate_pattern(reference_track=ref)
-            else:
-                t.generate_pattern()
+        with self._publish_lock:
+            ref = self.tracks[0] if self.tracks else None
+            for t in self.tracks:
+                if t.algorithm=="counterpoint":
+                    t.generate_pattern(reference_track=ref)
+                else:
+                    t.generate_pattern()
+            self._publish_locked()
 
     def start(self):
         if self.playing:
@@ -81,52 +284,254 @@ class SequencerEngine:
         if self.sequencer_thread and self.sequencer_thread.is_alive():
             self.sequencer_thread.join()
         self.sequencer_thread=None
-        for i in range(len(self.tracks)):
-            self.current_steps[i]=0
+        self.current_steps={ i:0 for i in range(len(self.arrangement)) }
+        self.current_gens={}
         print("[Engine] Stopped.")
 
     def run(self):
-        track_accum=[0.0]*len(self.tracks)
-        track_interval=[0.0]*len(self.tracks)
+        # Every event (steps and outbound clock) has an absolute
+        # perf_counter deadline measured from start_time, so sleep overshoot
+        # never accumulates into drift and notes and clock share one
+        # timeline. Playback state is keyed by Track object so a reorder or
+        # removal carries each track's position over.
+        arr=()
+        bpm=None
+        track_step=[]
+        track_next=[]
+        track_gen=[]  # index into snap.ca_rows for rule_based tracks
+        track_interval=[]
+        max_sleep=1.0/self.clock_resolution
 
-        for i,tr in enumerate(self.tracks):
-            track_interval[i]=60.0/(self._bpm*tr.subdivisions)
-        tick_dur=1.0/self.clock_resolution
+        # fire times of each step of the record track in the current cycle
+        rec_grid=[]
+        rec_seen=0  # steps of rec_grid filled in so far this cycle
+        rec_track=None
+
+        with self._io_lock:
+            self._running=True
+            trace=self.trace
+            clock_out=self.clock_output
+        # notes played while stopped belong to no cycle
+        self.record_queue.clear()
+        start_time=time.perf_counter()
+        if trace:
+            trace.begin(start_time)
+        if clock_out:
+            clock_out.send(song_position_msg(0))
+            if trace:
+                trace.record(start_time, time.perf_counter(), -1, 0, STATUS_SONGPOS)
+            clock_out.send(START_MSG)
+            if trace:
+                trace.record(start_time, time.perf_counter(), -1, 0, STATUS_START)
+        clock_next=start_time
+        clock_ticks=0
+        trace_offs=deque()
+        clock_interval=0.0
 
         while self.playing:
-            for i, track in enumerate(self.tracks):
-                track_accum[i]+=tick_dur
-                if track_accum[i]>=track_interval[i]:
-                    track_accum[i]-=track_interval[i]
-                    old_step=self.current_steps[i]
-                    new_step=(old_step+1)%track.step_count
-                    self.current_steps[i]=new_step
-
-                    step_data=track.steps[new_step]
-                    if step_data["active"]==1:
-                        # Use track-specific MIDI device if set, else engine's default
-                        output_device = None
-                        if track.midi_output_device:
-                            output_device = MIDIOutput(track.midi_output_device)
+            now=time.perf_counter()
+            new_arr=self.arrangement
+            if new_arr is not arr or bpm!=self._bpm:
+                bpm=self._bpm
+                new_interval=[60.0/(bpm*snap.subdivisions) for snap in new_arr]
+                if new_arr is not arr:
+                    prev={ snap.track:(track_step[j],track_next[j],track_gen[j],
+                                       snap.ca_rows,snap.ca_base)
+                           for j,snap in enumerate(arr) }
+                    track_step=[]
+                    track_next=[]
+                    track_gen=[]
+                    for j,snap in enumerate(new_arr):
+                        if snap.track in prev:
+                            st, nxt, gen, rows, base = prev[snap.track]
+                            track_step.append(st%snap.step_count)
+                            track_next.append(nxt)
+                            # same automaton run (or its window slid
+                            # forward) => keep our place in it
+                            if snap.ca_rows and (rows is snap.ca_rows or
+                                                 (rows and snap.ca_base>base)):
+                                gen=min(max(gen, snap.ca_base), snap.ca_base+len(snap.ca_rows)-1)
+                            else:
+                                gen=snap.ca_base
+                            track_gen.append(gen)
                         else:
-                            output_device = self.midi_output
+                            # join on the shared grid instead of at 'now'
+                            k=max(0, math.ceil((now-start_time-self.spin_margin)/new_interval[j]))
+                            track_step.append((k-1)%snap.step_count)
+                            track_next.append(start_time+k*new_interval[j])
+                            track_gen.append(snap.ca_base)
+                    self.current_steps={ i:st for i,st in enumerate(track_step) }
+                    self.current_gens={ i:g for i,g in enumerate(track_gen) }
+                    arr=new_arr
+                track_interval=new_interval
+                clock_interval=60.0/(bpm*MIDI_CLOCK_PPQN)
+
+            if clock_out:
+                while clock_next<=now:
+                    clock_out.send(CLOCK_MSG)
+                    if trace:
+                        trace.record(clock_next, time.perf_counter(), -1, clock_ticks, STATUS_CLOCK)
+                    clock_ticks+=1
+                    clock_next+=clock_interval
 
-                        if output_device:
-                            note=step_data["note"]
-                            vel=step_data["velocity"]
-                            output_device.note_on(note, vel, track.channel)
+            for i, snap in enumerate(arr):
+                due=track_next[i]
+                if due>now:
+                    continue
+                track_next[i]=due+track_interval[i]
+                new_step=(track_step[i]+1)%snap.step_count
+                track_step[i]=new_step
+                self.current_steps[i]=new_step
+
+                rows=snap.ca_rows
+                if rows and new_step==0 and due>start_time:
+                    # next precomputed generation: an index bump, no rule
+                    # math (poll() keeps the window ahead of us)
+                    track_gen[i]=min(track_gen[i]+1, snap.ca_base+len(rows)-1)
+                    self.current_gens[i]=track_gen[i]
+
+                if i==self.record_track_idx:
+                    if rec_track is not snap.track or len(rec_grid)!=snap.step_count:
+                        rec_track=snap.track
+                        rec_grid=[None]*snap.step_count
+                        rec_seen=0
+                    if new_step==0:
+                        if rec_seen==snap.step_count:
+                            self.merge_recorded(snap.track, rec_grid, due)
+                        else:
+                            # no full cycle to quantize against (just
+                            # started, re-armed or resized): drop what came
+                            # before this boundary rather than pile it on 0
+                            self.drop_recorded_before(due)
+                        rec_grid=[None]*snap.step_count
+                        rec_seen=0
+                    if rec_grid[new_step] is None:
+                        rec_seen+=1
+                    rec_grid[new_step]=due
+
+                active, note, vel = snap.steps[new_step]
+                if rows:
+                    active=(rows[track_gen[i]-snap.ca_base]>>new_step)&1
+                if active==1:
+                    # Use track-specific MIDI device if set, else engine's default
+                    output_device = None
+                    if snap.midi_output_device:
+                        output_device = MIDIOutput(snap.midi_output_device)
+                    else:
+                        output_device = self.midi_output
+
+                    if output_device:
+                        output_device.note_on(note, vel, snap.channel)
+                        if trace:
+                            trace.record(due, time.perf_counter(), i, new_step,
+                                         STATUS_NOTE_ON|(snap.channel&0x0F), note, vel)
+                            off=threading.Timer(0.15, self.traced_note_off,
+                                                args=(trace, output_device, note, vel, snap.channel,
+                                                      due+0.15, i, new_step))
+                            off.start()
+                            # kept so the log isn't closed before they land
+                            while trace_offs and not trace_offs[0].is_alive():
+                                trace_offs.popleft()
+                            trace_offs.append(off)
+                        else:
                             # schedule note_off
                             threading.Timer(0.15, output_device.note_off,
-                                            args=(note, vel, track.channel)).start()
+                                            args=(note, vel, snap.channel)).start()
+
+                        # if it's track-specific, close after usage
+                        if snap.midi_output_device:
+                            output_device.close()
 
-                            # if it's track-specific, close after usage
-                            if track.midi_output_device:
-                                output_device.close()
+                if self.on_step_callback:
+                    self.on_step_callback(i,new_step)
 
-                    if self.on_step_callback:
-                        self.on_step_callback(i,new_step)
+            # once this pass's notes are out, and never waiting on an editor:
+            # apply takes only if the lock is free right now, otherwise retry
+            # next pass (or poll() does)
+            if self.recorded_takes and self._publish_lock.acquire(blocking=False):
+                try:
+                    self._apply_recorded_locked()
+                finally:
+                    self._publish_lock.release()
 
-            time.sleep(tick_dur)
+            # sleep towards the earliest deadline, spin out the last stretch
+            deadline=min(track_next, default=now+max_sleep)
+            if clock_out:
+                deadline=min(deadline, clock_next)
+            wait=deadline-time.perf_counter()
+            if wait>self.spin_margin:
+                time.sleep(min(wait-self.spin_margin, max_sleep))
+            else:
+                while time.perf_counter()<deadline:
+                    pass
+
+        if clock_out:
+            clock_out.send(STOP_MSG)
+            clock_out.send(song_position_msg(0))
+            if trace:
+                now=time.perf_counter()
+                trace.record(now, now, -1, clock_ticks, STATUS_STOP)
+                trace.record(now, time.perf_counter(), -1, clock_ticks, STATUS_SONGPOS)
+        if trace:
+            for off in trace_offs:
+                off.join()
+            trace.flush()
+        self._release_io()
+
+    def _release_io(self):
+        with self._io_lock:
+            self._running=False
+            retired, self._retired = self._retired, []
+        for obj in retired:
+            obj.close()
+
+    def _retire(self, obj):
+        """
+        Close obj now, or once run() has finished with it if it's playing.
+        """
+        with self._io_lock:
+            if self._running:
+                self._retired.append(obj)
+                return
+        obj.close()
+
+    def traced_note_off(self, trace, output_device, note, vel, channel, intended, track_idx, step_idx):
+        # 'trace' is the recorder that logged the note-on, even if
+        # set_trace_file() has swapped in another since
+        output_device.note_off(note, vel, channel)
+        trace.record(intended, time.perf_counter(), track_idx, step_idx,
+                     STATUS_NOTE_OFF|(channel&0x0F), note, vel)
+
+    def set_trace_file(self, path):
+        """
+        Start logging emitted messages to path (binary, see tracelog.py),
+        or pass None to close the current log. Every start while it's open
+        adds a run to the log, with its own time origin. Takes effect on
+        the next start; a running loop keeps writing (including its pending
+        note-offs) to the current log, which is closed once it stops.
+        """
+        if self.trace:
+            self._retire(self.trace)
+            self.trace=None
+        if path:
+            self.trace=TraceRecorder(path)
+            print(f"[Engine] Tracing -> {path}")
+
+    def set_clock_outputs(self, device_names):
+        """
+        Make the engine a MIDI clock master on the given ports, or pass an
+        empty list/None to stop sending clock. Takes effect on the next start;
+        a running loop keeps its current ports until it stops.
+        """
+        if self.clock_output:
+            self._retire(self.clock_output)
+            self.clock_output=None
+        names=[n for n in (device_names or []) if n]
+        if not names:
+            print("[Engine] Clock master off.")
+            return
+        self.clock_output=MIDIFanOut([MIDIOutput(n) for n in names])
+        print(f"[Engine] Clock master -> {', '.join(names)}")
 
     # Device selection for engine-wide output
     def set_midi_output_device(self, device_name):
@@ -143,6 +548,9 @@ class SequencerEngine:
             return
         try:
             midi_in=MIDIInput(engine=self, port_name=device_name)
+            if self.midi_input:
+                self.midi_input.close()
+            self.midi_input=midi_in
             print(f"[Engine] MIDI input -> {device_name}")
         except Exception as e:
             print(f"[Engine] Error opening MIDI input: {e}")
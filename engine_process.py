@@ -0,0 +1,441 @@
+# engine_process.py
+
+import multiprocessing as mp
+import queue
+
+from track import Track, refill_ca_rows
+
+###################################
+# SHARED STATE
+###################################
+TAKE_CAPACITY = 4096
+
+class SharedArrangement:
+    """
+    Step data and playheads in shared memory, laid out as fixed-size
+    columns: slot i owns [i*max_steps, (i+1)*max_steps) of active/note/
+    velocity. Both processes map the same buffers; nothing is pickled per
+    edit.
+
+    Only the GUI side writes the columns. track_gen[i] is a seqlock: odd
+    while slot i is being written, bumped to the next even value when
+    done, so the engine side can tell a torn read and retry. 'layout' is
+    bumped with every add/remove/reorder so the engine side can ignore
+    column data until it has applied the matching structural command.
+
+    Recorded notes travel the other way through a separate ring of
+    (layout, track, step, note, velocity) entries that only the engine
+    side writes.
+    """
+    def __init__(self, max_tracks=64, max_steps=1024):
+        self.max_tracks = max_tracks
+        self.max_steps = max_steps
+        size = max_tracks*max_steps
+        self.active = mp.RawArray('B', size)
+        self.note = mp.RawArray('B', size)
+        self.velocity = mp.RawArray('B', size)
+        self.step_count = mp.RawArray('i', max_tracks)
+        self.channel = mp.RawArray('i', max_tracks)
+        self.subdivisions = mp.RawArray('i', max_tracks)
+        self.track_gen = mp.RawArray('L', max_tracks)
+        self.playhead = mp.RawArray('i', max_tracks)
+        self.playgen = mp.RawArray('L', max_tracks)
+        self.layout = mp.RawValue('L', 0)
+        self.playing = mp.RawValue('b', 0)
+        self.takes = mp.RawArray('i', TAKE_CAPACITY*5)
+        self.take_count = mp.RawValue('L', 0)
+
+    # --- GUI side writes, engine side reads ---
+    def write_track(self, i, track):
+        n = min(len(track.steps), self.max_steps)  # add_track clamps longer ones
+        base = i*self.max_steps
+        self.track_gen[i] += 1  # odd: slot in flux
+        memoryview(self.active).cast('B')[base:base+n] = bytes(s["active"]&1 for s in track.steps[:n])
+        memoryview(self.note).cast('B')[base:base+n] = bytes(s["note"]&0x7F for s in track.steps[:n])
+        memoryview(self.velocity).cast('B')[base:base+n] = bytes(s["velocity"]&0x7F for s in track.steps[:n])
+        self.step_count[i] = n
+        self.channel[i] = track.channel
+        self.subdivisions[i] = track.subdivisions
+        self.track_gen[i] += 1  # even: consistent again
+
+    def read_track(self, i):
+        """
+        Consistent copy of slot i as (gen, active, note, velocity, channel,
+        subdivisions), or None if a write was in progress.
+        """
+        gen = self.track_gen[i]
+        if gen & 1:
+            return None
+        n = min(max(self.step_count[i], 0), self.max_steps)
+        base = i*self.max_steps
+        act = bytes(memoryview(self.active).cast('B')[base:base+n])
+        notes = bytes(memoryview(self.note).cast('B')[base:base+n])
+        vels = bytes(memoryview(self.velocity).cast('B')[base:base+n])
+        channel = self.channel[i]
+        subdivisions = self.subdivisions[i]
+        if self.track_gen[i] != gen:
+            return None
+        return gen, act, notes, vels, channel, subdivisions
+
+    # --- engine side writes, GUI side reads ---
+    def push_take(self, layout, track_idx, step, note, velocity):
+        k = self.take_count.value
+        base = (k % TAKE_CAPACITY)*5
+        self.takes[base:base+5] = [layout, track_idx, step, note, velocity]
+        self.take_count.value = k+1  # publish only once the entry is whole
+
+    def read_takes(self, start):
+        """
+        Entries from index 'start' on; returns (entries, next start). If the
+        reader fell more than a ring behind, the overwritten ones are lost.
+        """
+        end = self.take_count.value
+        start = max(start, end-TAKE_CAPACITY)
+        out = []
+        for k in range(start, end):
+            base = (k % TAKE_CAPACITY)*5
+            out.append(tuple(self.takes[base:base+5]))
+        return out, end
+
+
+def _fill_track(track, data):
+    _, act, notes, vels, channel, subdivisions = data
+    n = len(act)
+    if len(track.steps) != n:
+        rows = track.ca_rows  # set separately over the command queue
+        track.set_step_count(n)
+        track.ca_rows = rows
+    for k, step_data in enumerate(track.steps):
+        step_data["active"] = act[k]
+        step_data["note"] = notes[k]
+        step_data["velocity"] = vels[k]
+    track.channel = channel
+    track.subdivisions = subdivisions
+
+
+###################################
+# ENGINE SIDE (child process)
+###################################
+def _engine_main(shared, commands, bpm, midi_output_name, poll_interval):
+    from engine import SequencerEngine
+    from midi_io import MIDIOutput
+
+    engine = SequencerEngine(bpm=bpm)
+    try:
+        engine.midi_output = MIDIOutput(midi_output_name)
+    except Exception as e:
+        print(f"[EngineProcess] No default MIDI output: {e}")
+
+    def on_step(track_idx, step):
+        shared.playgen[track_idx] = engine.current_gens.get(track_idx, 0)
+        shared.playhead[track_idx] = step
+    engine.on_step_callback = on_step
+
+    state = {"layout": 0}
+    seen_gen = [0]*shared.max_tracks
+
+    def on_take(track_idx, step, note, velocity):
+        shared.push_take(state["layout"], track_idx, step, note, velocity)
+    engine.take_listener = on_take
+    engine.ca_refill = False  # the GUI side slides ca_rows and sends them
+
+    while True:
+        try:
+            cmd = commands.get(timeout=poll_interval)
+        except queue.Empty:
+            cmd = None
+
+        while cmd is not None:
+            op = cmd[0]
+            if op == "quit":
+                engine.stop()
+                return
+            elif op == "start":
+                engine.start()
+            elif op == "stop":
+                engine.stop()
+            elif op == "bpm":
+                engine.set_bpm(cmd[1])
+            elif op == "add":
+                state["layout"] = cmd[1]
+                engine.add_track(Track(name=cmd[2]))
+            elif op == "remove":
+                state["layout"] = cmd[1]
+                engine.remove_track(cmd[2])
+            elif op == "reorder":
+                state["layout"] = cmd[1]
+                engine.reorder_tracks(cmd[2], cmd[3])
+            elif op == "track_device":
+                if cmd[1] < len(engine.tracks):
+                    engine.tracks[cmd[1]].midi_output_device = cmd[2]
+                    engine.publish(cmd[1])
+            elif op == "ca_rows":
+                def set_rows(track, rows=cmd[2], base=cmd[3]):
+                    track.ca_rows = rows
+                    track.ca_base = base
+                engine.apply_edit(cmd[1], set_rows)
+            elif op == "arm":
+                engine.arm_record(cmd[1])
+            elif op == "disarm":
+                engine.disarm_record()
+            elif op == "midi_out":
+                engine.set_midi_output_device(cmd[1])
+            elif op == "midi_in":
+                engine.set_midi_input_device(cmd[1])
+            elif op == "clock":
+                engine.set_clock_outputs(cmd[1])
+            elif op == "trace":
+                engine.set_trace_file(cmd[1])
+            try:
+                cmd = commands.get_nowait()
+            except queue.Empty:
+                cmd = None
+
+        # column data is only valid once we're on the GUI's layout
+        if state["layout"] == shared.layout.value:
+            for i in range(len(engine.tracks)):
+                if shared.track_gen[i] == seen_gen[i]:
+                    continue
+                data = shared.read_track(i)
+                if data is None:
+                    continue  # caught mid-write; next poll retries
+                seen_gen[i] = data[0]
+                engine.apply_edit(i, lambda track: _fill_track(track, data))
+
+        engine.poll()
+        shared.playing.value = 1 if engine.playing else 0
+
+
+###################################
+# GUI SIDE (proxy)
+###################################
+class EngineProcess:
+    """
+    Runs SequencerEngine in its own process so Tk redraws and pattern
+    generation never hold the GIL the timing loop needs. Exposes the same
+    methods the GUI calls on SequencerEngine: tracks are edited here as
+    usual, publish() copies them into shared memory, and transport/device
+    changes go over a small command queue.
+    """
+    def __init__(self, bpm=120, midi_output_name=None, max_tracks=64, max_steps=1024,
+                 poll_interval=0.005):
+        self._bpm = bpm
+        self.tracks = []
+        self.record_track_idx = None
+        self.on_step_callback = None  # unused: poll current_steps instead
+        self.shared = SharedArrangement(max_tracks, max_steps)
+        ctx = mp.get_context("spawn")
+        self.commands = ctx.Queue()
+        self.process = ctx.Process(target=_engine_main,
+                                   args=(self.shared, self.commands, bpm, midi_output_name, poll_interval),
+                                   daemon=True)
+        self.process.start()
+        self._take_read = 0
+        self._sent_devices = {}
+        self._sent_rows = {}
+
+    # --- transport ---
+    @property
+    def bpm(self):
+        return self._bpm
+
+    def set_bpm(self, new_bpm):
+        if new_bpm<1:
+            new_bpm=1
+        self._bpm=new_bpm
+        self.commands.put(("bpm", new_bpm))
+
+    @property
+    def playing(self):
+        return bool(self.shared.playing.value)
+
+    def start(self):
+        self.commands.put(("start",))
+
+    def stop(self):
+        self.commands.put(("stop",))
+
+    @property
+    def current_steps(self):
+        return { i:self.shared.playhead[i] for i in range(len(self.tracks)) }
+
+    @property
+    def current_gens(self):
+        return { i:self.shared.playgen[i] for i in range(len(self.tracks)) }
+
+    def close(self):
+        self.commands.put(("quit",))
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    # --- arrangement ---
+    def apply_edit(self, track_idx, edit):
+        """
+        Run edit(track) and publish it; the same call as on the in-process
+        engine, where it also takes the publish lock.
+        """
+        if 0<=track_idx<len(self.tracks):
+            edit(self.tracks[track_idx])
+            self.publish(track_idx)
+
+    def publish(self, track_idx=None):
+        """
+        Copy track state into shared memory; the engine process picks it
+        up on its next poll.
+        """
+        if track_idx is None:
+            for i, track in enumerate(self.tracks):
+                self.shared.write_track(i, track)
+        elif 0<=track_idx<len(self.tracks):
+            track = self.tracks[track_idx]
+            self.shared.write_track(track_idx, track)
+        self.sync_devices(track_idx)
+
+    def sync_devices(self, track_idx=None):
+        """
+        Per-track device names and precomputed automaton rows don't fit the
+        byte columns, so they travel over the command queue, and only when
+        they changed.
+        """
+        idxs = range(len(self.tracks)) if track_idx is None else [track_idx]
+        for i in idxs:
+            if 0<=i<len(self.tracks):
+                dev = self.tracks[i].midi_output_device
+                if self._sent_devices.get(i) != dev:
+                    self._sent_devices[i] = dev
+                    self.commands.put(("track_device", i, dev))
+                rows = self.tracks[i].ca_rows
+                if self._sent_rows.get(i) is not rows:
+                    self._sent_rows[i] = rows
+                    self.commands.put(("ca_rows", i, rows, self.tracks[i].ca_base))
+
+    def _bump_layout(self):
+        self._sent_devices = {}
+        self._sent_rows = {}
+        self.shared.layout.value += 1
+        return self.shared.layout.value
+
+    @property
+    def max_steps(self):
+        return self.shared.max_steps
+
+    def _fit_steps(self, track):
+        # a slot holds max_steps; shorten the track itself rather than
+        # play something other than what the GUI shows
+        if track.step_count>self.shared.max_steps:
+            print(f"[EngineProcess] {track.name}: {track.step_count} steps, "
+                  f"truncated to {self.shared.max_steps}.")
+            track.set_step_count(self.shared.max_steps)
+
+    def add_track(self, track):
+        if len(self.tracks)>=self.shared.max_tracks:
+            raise ValueError(f"EngineProcess holds at most {self.shared.max_tracks} tracks.")
+        self._fit_steps(track)
+        self.tracks.append(track)
+        self.commands.put(("add", self._bump_layout(), track.name))
+        self.publish()
+
+    def add_tracks(self, tracks):
+        """
+        Append several tracks and write shared memory once at the end.
+        """
+        tracks=list(tracks)
+        if len(self.tracks)+len(tracks)>self.shared.max_tracks:
+            raise ValueError(f"EngineProcess holds at most {self.shared.max_tracks} tracks.")
+        for track in tracks:
+            self._fit_steps(track)
+            self.tracks.append(track)
+            self.commands.put(("add", self._bump_layout(), track.name))
+        self.publish()
+
+    def remove_track(self, track_idx):
+        if 0<=track_idx<len(self.tracks):
+            del self.tracks[track_idx]
+            if self.record_track_idx==track_idx:
+                self.disarm_record()
+            elif self.record_track_idx is not None and self.record_track_idx>track_idx:
+                self.record_track_idx-=1
+            self.commands.put(("remove", self._bump_layout(), track_idx))
+            self.publish()
+
+    def reorder_tracks(self, old_index, new_index):
+        if old_index<0 or old_index>=len(self.tracks):
+            return
+        if new_index<0 or new_index>=len(self.tracks):
+            return
+        track=self.tracks.pop(old_index)
+        self.tracks.insert(new_index, track)
+        if self.record_track_idx is not None:
+            rec=self.record_track_idx
+            if rec==old_index:
+                self.record_track_idx=new_index
+            elif old_index<rec<=new_index:
+                self.record_track_idx=rec-1
+            elif new_index<=rec<old_index:
+                self.record_track_idx=rec+1
+        self.commands.put(("reorder", self._bump_layout(), old_index, new_index))
+        self.publish()
+
+    def generate_all_tracks(self):
+        ref = self.tracks[0] if self.tracks else None
+        for t in self.tracks:
+            if t.algorithm=="counterpoint":
+                t.generate_pattern(reference_track=ref)
+            else:
+                t.generate_pattern()
+        self.publish()
+
+    # --- recording ---
+    def arm_record(self, track_idx):
+        if track_idx is None or not (0<=track_idx<len(self.tracks)):
+            self.disarm_record()
+            return
+        self.record_track_idx=track_idx
+        self.commands.put(("arm", track_idx))
+
+    def disarm_record(self):
+        self.record_track_idx=None
+        self.commands.put(("disarm",))
+
+    def poll(self):
+        """
+        Apply notes recorded by the engine process to the local tracks
+        (only those steps, so local edits made meanwhile survive) and
+        publish them back; slide automaton windows the engine process has
+        played halfway through.
+        """
+        if self.playing:
+            refill_ca_rows(self.tracks, self.current_gens, self.apply_edit)
+        takes, self._take_read = self.shared.read_takes(self._take_read)
+        if not takes:
+            return
+        layout = self.shared.layout.value
+        touched = set()
+        for take_layout, t_idx, step, note, vel in takes:
+            if take_layout != layout or t_idx >= len(self.tracks):
+                continue  # recorded against an arrangement that's gone
+            track = self.tracks[t_idx]
+            if step >= len(track.steps):
+                continue
+            step_data = track.steps[step]
+            step_data["active"] = 1
+            step_data["note"] = note
+            step_data["velocity"] = vel
+            track.ca_rows = None  # the engine side froze its copy too
+            touched.add(t_idx)
+        for t_idx in touched:
+            self.publish(t_idx)
+
+    # --- devices ---
+    def set_midi_output_device(self, device_name):
+        self.commands.put(("midi_out", device_name))
+
+    def set_midi_input_device(self, device_name):
+        self.commands.put(("midi_in", device_name))
+
+    def set_clock_outputs(self, device_names):
+        self.commands.put(("clock", list(device_names or [])))
+
+    def set_trace_file(self, path):
+        self.commands.put(("trace", path))
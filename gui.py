@@ -1,12 +1,23 @@
 # gui.py
 
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, filedialog, simpledialog, messagebox
 import mido
+from operator import itemgetter
 from track import midi_to_note_name, note_name_to_midi, NOTE_NAMES, Track
+from midi_file import import_midi_file
 
 GRID_CELL_SIZE = 30
 GRID_CELL_GAP = 5
+GRID_ROW_GAP = 30
+GRID_TOP = 20
+GRID_LABEL_WIDTH = 200
+GRID_COL_PITCH = GRID_CELL_SIZE+GRID_CELL_GAP
+GRID_ROW_PITCH = GRID_CELL_SIZE+GRID_ROW_GAP
+IMPORT_DEFAULT_STEPS = 64
+IMPORT_MAX_STEPS = 1024
+OVERVIEW_MAX_LANE = 12
+OVERVIEW_LANE_GAP = 4
 
 class GridSequencerGUI:
     def __init__(self, master, engine):
@@ -33,6 +44,8 @@ class GridSequencerGUI:
 
         self.add_track_btn = ttk.Button(self.track_list_frame, text="+ Add Track", command=self.add_new_track)
         self.add_track_btn.pack(fill="x", pady=5)
+        self.import_btn = ttk.Button(self.track_list_frame, text="Import MIDI...", command=self.import_midi)
+        self.import_btn.pack(fill="x", pady=5)
 
         # We'll store a list of track "labels" that can be drag-and-drop reorder
         self.track_label_frames=[]
@@ -42,9 +55,33 @@ class GridSequencerGUI:
         self.canvas_frame = ttk.Frame(self.main_area)
         self.canvas_frame.pack(side="left", fill="both", expand=True)
 
-        self.canvas = tk.Canvas(self.canvas_frame, bg="#1e1e1e")
+        # The canvas only ever holds items for the visible viewport. We scroll
+        # by moving view_x/view_y and re-using the same pooled items, so the
+        # item count stays flat no matter how big the arrangement gets.
+        self.xscroll = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.on_xscroll)
+        self.xscroll.pack(side="bottom", fill="x")
+        self.yscroll = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.on_yscroll)
+        self.yscroll.pack(side="right", fill="y")
+        self.canvas = tk.Canvas(self.canvas_frame, bg="#1e1e1e", highlightthickness=0)
         self.canvas.pack(fill="both", expand=True)
 
+        self.view_x=0
+        self.view_y=0
+        self.overview=False
+        self.shown_gens={}  # current_gens the cells were last colored from
+        self.cell_pool=[]
+        self.label_pool=[]
+        self.label_bg=self.canvas.create_rectangle(0,0,0,0, fill="#1e1e1e", width=0, tags=("label",))
+
+        # One handler for the whole canvas: map the click back to (track, step)
+        self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Double-Button-1>", self.on_canvas_double_click)
+        self.canvas.bind("<Configure>", lambda e: self.draw_viewport())
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+        self.canvas.bind("<Shift-MouseWheel>", self.on_shift_mousewheel)
+        self.canvas.bind("<Button-4>", lambda e: self.scroll_by(0, -GRID_ROW_PITCH))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll_by(0, GRID_ROW_PITCH))
+
         # Right: property panel for selected track
         self.prop_frame = ttk.Frame(self.main_area, width=300, padding=5)
         self.prop_frame.pack(side="right", fill="y")
@@ -62,8 +99,6 @@ class GridSequencerGUI:
 
         # For storing canvas squares
         self.grid_cells={}
-        self.active_steps={ i:-1 for i in range(len(self.engine.tracks)) }
-        self.engine.on_step_callback=self.on_step_changed
 
         # Initially build track list UI
         self.rebuild_track_list()
@@ -85,6 +120,10 @@ class GridSequencerGUI:
         ttk.Button(self.top_bar, text="Play", command=self.engine.start).pack(side="left", padx=5)
         ttk.Button(self.top_bar, text="Stop", command=self.engine.stop).pack(side="left", padx=5)
         ttk.Button(self.top_bar, text="Generate All", command=self.engine.generate_all_tracks).pack(side="left", padx=5)
+        self.rec_btn=ttk.Button(self.top_bar, text="Rec Arm", command=self.toggle_record_arm)
+        self.rec_btn.pack(side="left", padx=5)
+        self.overview_btn=ttk.Button(self.top_bar, text="Overview", command=self.toggle_overview)
+        self.overview_btn.pack(side="left", padx=5)
 
         out_lbl=ttk.Label(self.top_bar, text="Default MIDI Out:")
         out_lbl.pack(side="left", padx=5)
@@ -102,14 +141,39 @@ class GridSequencerGUI:
         in_cb.pack(side="left", padx=2)
         in_cb.bind("<<ComboboxSelected>>", self.on_global_in_changed)
 
+        clk_lbl=ttk.Label(self.top_bar, text="Clock Out:")
+        clk_lbl.pack(side="left", padx=5)
+        self.clock_out_var=tk.StringVar(value="None")
+        clk_cb=ttk.Combobox(self.top_bar, textvariable=self.clock_out_var, values=["None"]+outs, width=18)
+        clk_cb.pack(side="left", padx=2)
+        clk_cb.bind("<<ComboboxSelected>>", self.on_clock_out_changed)
+
     def set_bpm(self):
         new_bpm=self.bpm_var.get()
         self.engine.set_bpm(new_bpm)
 
+    def toggle_record_arm(self):
+        """
+        Arm the selected track for live MIDI recording, or disarm if armed.
+        """
+        if self.engine.record_track_idx is not None:
+            self.engine.disarm_record()
+            self.rec_btn.config(text="Rec Arm")
+            return
+        if self.selected_track_idx is None:
+            return
+        self.engine.arm_record(self.selected_track_idx)
+        if self.engine.record_track_idx is not None:
+            self.rec_btn.config(text="Rec Off")
+
     def on_global_out_changed(self, event):
         dev=self.global_out_var.get()
         self.engine.set_midi_output_device(dev)
 
+    def on_clock_out_changed(self, event):
+        dev=self.clock_out_var.get()
+        self.engine.set_clock_outputs([] if dev=="None" else [dev])
+
     def on_global_in_changed(self, event):
         dev=self.global_in_var.get()
         if dev=="Internal (No Clock)":
@@ -155,8 +219,8 @@ class GridSequencerGUI:
         # We'll do a simple approach: check bounding boxes
         # We can compare the midpoints to reorder.
 
-        # get the order in the track_list_frame
-        children=self.track_list_frame.winfo_children()
+        # get the order of the track labels (the buttons above them don't count)
+        children=self.track_label_frames
         # find which child is nearest to release_y
         # Let's collect (child, y_top, y_bottom)
         positions=[]
@@ -191,6 +255,29 @@ class GridSequencerGUI:
         self.rebuild_track_list()
         self.render_grid()
 
+    def import_midi(self):
+        path=filedialog.askopenfilename(filetypes=[("MIDI files","*.mid *.midi"),("All files","*.*")])
+        if not path:
+            return
+        # a whole file at one step per 16th can be 100k+ steps per track;
+        # import a pattern-sized window instead
+        max_steps=min(IMPORT_MAX_STEPS, getattr(self.engine, "max_steps", IMPORT_MAX_STEPS))
+        step_count=simpledialog.askinteger("Import MIDI", f"Steps per track (1-{max_steps}):",
+                                           initialvalue=min(IMPORT_DEFAULT_STEPS, max_steps),
+                                           minvalue=1, maxvalue=max_steps, parent=self.master)
+        if not step_count:
+            return
+        fold=messagebox.askyesno("Import MIDI", "Wrap notes past the last step onto the pattern?\n"
+                                 "(No drops them.)", parent=self.master)
+        try:
+            tracks=import_midi_file(path, step_count=step_count, subdivisions=4, fold=fold)
+        except (OSError, ValueError) as e:
+            print(f"[GUI] MIDI import failed: {e}")
+            return
+        self.engine.add_tracks(tracks)
+        self.rebuild_track_list()
+        self.render_grid()
+
     # ---------------------------
     # Track Props
     # ---------------------------
@@ -296,11 +383,13 @@ class GridSequencerGUI:
             track.midi_output_device=None
 
         # re-generate if needed
-        if track.algorithm=="counterpoint":
-            ref = self.engine.tracks[0] if len(self.engine.tracks)>0 else None
-            track.generate_pattern(reference_track=ref)
-        else:
-            track.generate_pattern()
+        ref = self.engine.tracks[0] if len(self.engine.tracks)>0 else None
+        def regenerate(track):
+            if track.algorithm=="counterpoint":
+                track.generate_pattern(reference_track=ref)
+            else:
+                track.generate_pattern()
+        self.engine.apply_edit(self.selected_track_idx, regenerate)
         self.render_grid()
 
     def apply_step_changes(self):
@@ -315,47 +404,309 @@ class GridSequencerGUI:
         if self.selected_step_idx>=track.step_count:
             return
 
-        step_data=track.steps[self.selected_step_idx]
-        step_data["note"]=note_name_to_midi(self.step_note_var.get())
-        step_data["velocity"]=self.step_vel_var.get()
+        note=note_name_to_midi(self.step_note_var.get())
+        vel=self.step_vel_var.get()
+        def set_note(track):
+            step_data=track.steps[self.selected_step_idx]
+            step_data["note"]=note
+            step_data["velocity"]=vel
+        self.engine.apply_edit(self.selected_track_idx, set_note)
 
         # If active, recolor
         rect_id=self.grid_cells.get((self.selected_track_idx,self.selected_step_idx))
         if rect_id:
-            self.canvas.itemconfig(rect_id, fill=self.get_step_color(step_data))
+            self.canvas.itemconfig(rect_id, fill=self.cell_color(self.selected_track_idx, self.selected_step_idx))
 
     # ---------------------------
     # GRID RENDERING
     # ---------------------------
     def render_grid(self):
-        self.canvas.delete("all")
+        """
+        Call after tracks or steps change. Clamps the scroll position to the
+        new arrangement size and redraws the visible part.
+        """
+        self.clamp_view()
+        self.draw_viewport()
+
+    def content_size(self):
+        max_steps=max((len(t.steps) for t in self.engine.tracks), default=0)
+        width=max_steps*GRID_COL_PITCH
+        height=GRID_TOP+len(self.engine.tracks)*GRID_ROW_PITCH
+        return width, height
+
+    def viewport_size(self):
+        w=max(1, self.canvas.winfo_width()-GRID_LABEL_WIDTH)
+        h=max(1, self.canvas.winfo_height())
+        return w, h
+
+    def clamp_view(self):
+        cw, ch = self.content_size()
+        vw, vh = self.viewport_size()
+        self.view_x=int(max(0, min(self.view_x, cw-vw)))
+        self.view_y=int(max(0, min(self.view_y, ch-vh)))
+
+    def update_scrollbars(self):
+        if self.overview:
+            self.xscroll.set(0.0, 1.0)
+            self.yscroll.set(0.0, 1.0)
+            return
+        cw, ch = self.content_size()
+        vw, vh = self.viewport_size()
+        if cw>0:
+            self.xscroll.set(self.view_x/cw, min(1.0,(self.view_x+vw)/cw))
+        else:
+            self.xscroll.set(0.0, 1.0)
+        self.yscroll.set(self.view_y/ch, min(1.0,(self.view_y+vh)/ch))
+
+    def on_xscroll(self, *args):
+        self.scroll_cmd(args, horizontal=True)
+
+    def on_yscroll(self, *args):
+        self.scroll_cmd(args, horizontal=False)
+
+    def scroll_cmd(self, args, horizontal):
+        if self.overview:
+            return
+        cw, ch = self.content_size()
+        vw, vh = self.viewport_size()
+        size, page, unit = (cw, vw, GRID_COL_PITCH) if horizontal else (ch, vh, GRID_ROW_PITCH)
+        pos=self.view_x if horizontal else self.view_y
+        if args[0]=="moveto":
+            pos=float(args[1])*size
+        elif args[0]=="scroll":
+            amount=int(args[1])
+            pos+=amount*(page if args[2]=="pages" else unit)
+        if horizontal:
+            self.view_x=pos
+        else:
+            self.view_y=pos
+        self.render_grid()
+
+    def scroll_by(self, dx, dy):
+        if self.overview:
+            return
+        self.view_x+=dx
+        self.view_y+=dy
+        self.render_grid()
+
+    def on_mousewheel(self, event):
+        self.scroll_by(0, -GRID_ROW_PITCH if event.delta>0 else GRID_ROW_PITCH)
+
+    def on_shift_mousewheel(self, event):
+        self.scroll_by(-GRID_COL_PITCH*4 if event.delta>0 else GRID_COL_PITCH*4, 0)
+
+    def pooled_item(self, pool, used, factory):
+        if used<len(pool):
+            return pool[used]
+        item=factory()
+        pool.append(item)
+        return item
+
+    def draw_viewport(self):
+        """
+        Position pooled rectangles/labels over the visible (track, step)
+        window. Items past what's needed are hidden, never deleted.
+        """
+        self.canvas.delete("overview")
         self.grid_cells.clear()
+        if self.overview:
+            for item in self.cell_pool+self.label_pool:
+                self.canvas.itemconfig(item, state="hidden")
+            self.canvas.itemconfig(self.label_bg, state="hidden")
+            self.draw_overview()
+            self.update_scrollbars()
+            return
 
-        y_offset=20
-        for t_idx, track in enumerate(self.engine.tracks):
-            label_txt=f"{track.name} (Ch {track.channel})"
-            self.canvas.create_text(10, y_offset+GRID_CELL_SIZE/2, text=label_txt, anchor="w",
-                                    fill="#ffffff", font=("Arial",11,"bold"))
-            x_offset=200
-            for s_idx, step_data in enumerate(track.steps):
-                x1=x_offset
-                y1=y_offset
-                x2=x1+GRID_CELL_SIZE
-                y2=y1+GRID_CELL_SIZE
-                fill_color=self.get_step_color(step_data)
-                rect_id=self.canvas.create_rectangle(x1,y1,x2,y2, fill=fill_color, outline="#000000")
+        vw, vh = self.viewport_size()
+        tracks=self.engine.tracks
+        t0=max(0, (self.view_y-GRID_TOP)//GRID_ROW_PITCH)
+        t1=min(len(tracks), (self.view_y+vh-GRID_TOP)//GRID_ROW_PITCH+1)
+        s0=self.view_x//GRID_COL_PITCH
+        s1=(self.view_x+vw)//GRID_COL_PITCH+1
+
+        used_cells=0
+        used_labels=0
+        for t_idx in range(t0, t1):
+            track=tracks[t_idx]
+            y1=GRID_TOP+t_idx*GRID_ROW_PITCH-self.view_y
+
+            lbl=self.pooled_item(self.label_pool, used_labels,
+                lambda: self.canvas.create_text(0,0, anchor="w", fill="#ffffff",
+                                                font=("Arial",11,"bold"), tags=("label",)))
+            used_labels+=1
+            self.canvas.coords(lbl, 10, y1+GRID_CELL_SIZE/2)
+            self.canvas.itemconfig(lbl, text=f"{track.name} (Ch {track.channel})", state="normal")
+
+            for s_idx in range(s0, min(s1, len(track.steps))):
+                x1=GRID_LABEL_WIDTH+s_idx*GRID_COL_PITCH-self.view_x
+                rect_id=self.pooled_item(self.cell_pool, used_cells,
+                    lambda: self.canvas.create_rectangle(0,0,0,0, outline="#000000"))
+                used_cells+=1
+                self.canvas.coords(rect_id, x1, y1, x1+GRID_CELL_SIZE, y1+GRID_CELL_SIZE)
+                self.canvas.itemconfig(rect_id, fill=self.cell_color(t_idx, s_idx),
+                                       outline="#000000", width=1, state="normal")
                 self.grid_cells[(t_idx,s_idx)]=rect_id
 
-                self.canvas.tag_bind(rect_id, "<Button-1>",
-                                     lambda e, tr_i=t_idx, st_i=s_idx: self.toggle_step(tr_i,st_i))
-                self.canvas.tag_bind(rect_id, "<Double-Button-1>",
-                                     lambda e, tr_i=t_idx, st_i=s_idx: self.select_step(tr_i,st_i))
+        for item in self.cell_pool[used_cells:]:
+            self.canvas.itemconfig(item, state="hidden")
+        for item in self.label_pool[used_labels:]:
+            self.canvas.itemconfig(item, state="hidden")
+
+        # label column sits above partially scrolled cells
+        self.canvas.coords(self.label_bg, 0, 0, GRID_LABEL_WIDTH, vh)
+        self.canvas.itemconfig(self.label_bg, state="normal")
+        self.canvas.tag_raise("label")
+        self.update_scrollbars()
+
+    def overview_geometry(self):
+        """
+        (lane height, pixels per step) for the zoomed-out view, sized so
+        every track and the longest pattern fit the canvas.
+        """
+        vw, vh = self.viewport_size()
+        n=max(1, len(self.engine.tracks))
+        lane=max(2, min(OVERVIEW_MAX_LANE, (vh-GRID_TOP)//n-OVERVIEW_LANE_GAP))
+        max_steps=max((len(t.steps) for t in self.engine.tracks), default=1)
+        return lane, vw/max(1,max_steps)
 
-                x_offset+=(GRID_CELL_SIZE+GRID_CELL_GAP)
-            y_offset+=(GRID_CELL_SIZE+30)
+    def draw_overview(self):
+        """
+        Compressed lanes: each track is one thin strip, adjacent active steps
+        that land on the same pixels are merged into a single rectangle.
+        """
+        lane, px = self.overview_geometry()
+        for t_idx in range(len(self.engine.tracks)):
+            self.draw_overview_lane(t_idx, lane, px)
+
+        # outline the region the normal view is showing
+        pitch=lane+OVERVIEW_LANE_GAP
+        vw, vh = self.viewport_size()
+        x1=GRID_LABEL_WIDTH+self.view_x/GRID_COL_PITCH*px
+        x2=GRID_LABEL_WIDTH+(self.view_x+vw)/GRID_COL_PITCH*px
+        y1=GRID_TOP+max(0,(self.view_y-GRID_TOP))/GRID_ROW_PITCH*pitch
+        y2=GRID_TOP+max(0,(self.view_y+vh-GRID_TOP))/GRID_ROW_PITCH*pitch
+        self.canvas.create_rectangle(x1, y1, x2, y2, outline="#FFFF00",
+                                     tags=("overview", "overview_view"))
+
+    def draw_overview_lane(self, t_idx, lane, px):
+        """
+        (Re)draw one track's strip. Active steps are found with find() on
+        the lane's bits and everything else in the same pixel column is
+        skipped, so the work is bounded by the lane's width in pixels, not
+        its step count.
+        """
+        tags=("overview", f"lane{t_idx}")
+        self.canvas.delete(tags[1])
+        track=self.engine.tracks[t_idx]
+        n=len(track.steps)
+        y1=GRID_TOP+t_idx*(lane+OVERVIEW_LANE_GAP)
+        y2=y1+lane
+        self.canvas.create_rectangle(GRID_LABEL_WIDTH, y1, GRID_LABEL_WIDTH+n*px, y2,
+                                     fill="#333333", width=0, tags=tags)
+        if lane>=8:
+            self.canvas.create_text(10, y1+lane/2, text=track.name, anchor="w",
+                                    fill="#ffffff", font=("Arial",8), tags=tags)
+        bits, on = self.lane_bits(t_idx)
+        run_start=None
+        run_end=None
+        s_idx=bits.find(on, 0, n)
+        while s_idx>=0:
+            x1=GRID_LABEL_WIDTH+s_idx*px
+            x2=x1+max(1.0, px)
+            if run_start is not None and x1<=run_end+1:
+                run_end=x2
+            else:
+                if run_start is not None:
+                    self.canvas.create_rectangle(run_start, y1, run_end, y2,
+                                                 fill="#00c000", width=0, tags=tags)
+                run_start, run_end = x1, x2
+            # first step of the next pixel column
+            s_idx=bits.find(on, max(s_idx+1, int((int(s_idx*px)+1)/px)), n)
+        if run_start is not None:
+            self.canvas.create_rectangle(run_start, y1, run_end, y2,
+                                         fill="#00c000", width=0, tags=tags)
+
+    def toggle_overview(self):
+        self.overview=not self.overview
+        self.overview_btn.config(text="Grid" if self.overview else "Overview")
+        self.render_grid()
 
-    def get_step_color(self, step_data):
-        if step_data["active"]==0:
+    def cell_at(self, x, y):
+        """
+        Map canvas coordinates to (track_idx, step_idx), or None if the
+        point is in the label column, a gap, or past the end of a track.
+        """
+        if x<GRID_LABEL_WIDTH:
+            return None
+        lx=x-GRID_LABEL_WIDTH+self.view_x
+        ly=y-GRID_TOP+self.view_y
+        if lx<0 or ly<0:
+            return None
+        s_idx=int(lx//GRID_COL_PITCH)
+        t_idx=int(ly//GRID_ROW_PITCH)
+        if lx-s_idx*GRID_COL_PITCH>GRID_CELL_SIZE or ly-t_idx*GRID_ROW_PITCH>GRID_CELL_SIZE:
+            return None
+        if t_idx>=len(self.engine.tracks) or s_idx>=self.engine.tracks[t_idx].step_count:
+            return None
+        return t_idx, s_idx
+
+    def on_canvas_click(self, event):
+        if self.overview:
+            # jump the grid view to the clicked spot
+            lane, px = self.overview_geometry()
+            t_idx=int((event.y-GRID_TOP)//(lane+OVERVIEW_LANE_GAP))
+            s_idx=int((event.x-GRID_LABEL_WIDTH)/px) if px>0 else 0
+            vw, vh = self.viewport_size()
+            self.view_x=s_idx*GRID_COL_PITCH-vw//2
+            self.view_y=GRID_TOP+t_idx*GRID_ROW_PITCH-vh//2
+            self.toggle_overview()
+            return
+        hit=self.cell_at(event.x, event.y)
+        if hit:
+            self.toggle_step(*hit)
+
+    def on_canvas_double_click(self, event):
+        if self.overview:
+            return
+        hit=self.cell_at(event.x, event.y)
+        if hit:
+            self.select_step(*hit)
+
+    def step_active(self, track_idx, step_idx):
+        """
+        Whether a step sounds right now: for a rule_based track that's its
+        bit in the generation the engine is playing, otherwise the step's
+        own flag.
+        """
+        track=self.engine.tracks[track_idx]
+        rows=track.ca_rows
+        if rows and self.engine.playing:
+            k=self.engine.current_gens.get(track_idx,0)-track.ca_base
+            if 0<=k<len(rows):
+                return (rows[k]>>step_idx)&1
+        return track.steps[step_idx]["active"]
+
+    def lane_bits(self, track_idx):
+        """
+        (buffer, marker): what step_active() gives for every step of the
+        track, as a str or bytes in which the marker is an active step.
+        """
+        track=self.engine.tracks[track_idx]
+        rows=track.ca_rows
+        if rows and self.engine.playing:
+            k=self.engine.current_gens.get(track_idx,0)-track.ca_base
+            if 0<=k<len(rows):
+                return bin(rows[k])[:1:-1], "1"  # lowest bit = step 0
+        return bytes(map(itemgetter("active"), track.steps)), 1
+
+    def cell_color(self, track_idx, step_idx):
+        step_data=self.engine.tracks[track_idx].steps[step_idx]
+        return self.get_step_color(step_data, self.step_active(track_idx, step_idx))
+
+    def get_step_color(self, step_data, active=None):
+        if active is None:
+            active=step_data["active"]
+        if not active:
             return "#333333"
         else:
             vel=step_data["velocity"]
@@ -365,10 +716,9 @@ class GridSequencerGUI:
     def toggle_step(self, track_idx, step_idx):
         if track_idx<0 or track_idx>=len(self.engine.tracks):
             return
-        track=self.engine.tracks[track_idx]
-        track.toggle_step(step_idx)
+        self.engine.apply_edit(track_idx, lambda track: track.toggle_step(step_idx))
         cell_id=self.grid_cells.get((track_idx,step_idx))
-        new_color=self.get_step_color(track.steps[step_idx])
+        new_color=self.cell_color(track_idx, step_idx)
         if cell_id:
             self.canvas.itemconfig(cell_id, fill=new_color)
 
@@ -406,15 +756,16 @@ class GridSequencerGUI:
             self.step_vel_var.set(step_data["velocity"])
 
     # ---------------------------
-    # ENGINE CALLBACK + LOOP
+    # ENGINE POLL LOOP
     # ---------------------------
-    def on_step_changed(self, track_idx, new_step):
-        self.active_steps[track_idx]=new_step
-
     def update_ui(self):
+        # Playheads are polled rather than pushed, so the timing loop (which
+        # may live in another process) never calls into Tk code.
+        self.engine.poll()
         if self.engine.playing:
+            active_steps=self.engine.current_steps
             for (t_i, s_i), rect_id in self.grid_cells.items():
-                if s_i==self.active_steps.get(t_i,-1):
+                if s_i==active_steps.get(t_i,-1):
                     self.canvas.itemconfig(rect_id, outline="#FFFF00", width=2)
                 else:
                     self.canvas.itemconfig(rect_id, outline="#000000", width=1)
@@ -423,4 +774,26 @@ class GridSequencerGUI:
             for rect_id in self.grid_cells.values():
                 self.canvas.itemconfig(rect_id, outline="#000000", width=1)
 
+        # recorded notes are merged by the engine, and rule_based tracks
+        # move to a new generation every cycle; pick up new colors
+        gens=self.engine.current_gens if self.engine.playing else {}
+        changed={ t_i for t_i in gens.keys()|self.shown_gens.keys()
+                  if gens.get(t_i,0)!=self.shown_gens.get(t_i,0) }
+        self.shown_gens=dict(gens)
+        if self.overview:
+            if changed:
+                lane, px = self.overview_geometry()
+                for t_i in changed:
+                    if t_i<len(self.engine.tracks):
+                        self.draw_overview_lane(t_i, lane, px)
+                self.canvas.tag_raise("overview_view")
+        else:
+            rec_idx=self.engine.record_track_idx
+            if rec_idx is not None:
+                changed.add(rec_idx)
+            n_tracks=len(self.engine.tracks)
+            for (t_i, s_i), rect_id in self.grid_cells.items():
+                if t_i in changed and t_i<n_tracks and s_i<len(self.engine.tracks[t_i].steps):
+                    self.canvas.itemconfig(rect_id, fill=self.cell_color(t_i, s_i))
+
         self.master.after(self.refresh_ms, self.update_ui)
@@ -1,12 +1,19 @@
 # main.py
 
+import argparse
 import tkinter as tk
 from track import Track
 from engine import SequencerEngine
+from engine_process import EngineProcess
 from midi_io import MIDIOutput
 from gui import GridSequencerGUI
 
 def main():
+    parser = argparse.ArgumentParser(description="Grid sequencer")
+    parser.add_argument("--engine-process", action="store_true",
+                        help="run the sequencer engine in its own process")
+    args = parser.parse_args()
+
     # Create a couple of tracks
     track1 = Track(name="Cantus Firmus", step_count=8, channel=1, subdivisions=2)
     track1.algorithm = "euclidean"
@@ -17,19 +24,27 @@ def main():
     track2.algorithm = "counterpoint"
     track2.generative_params = {"species":"1st","intervals":[3,4,7,12],"avoid_parallel":True}
 
-    engine = SequencerEngine(bpm=120)
+    if args.engine_process:
+        # the engine process opens its own default MIDI out
+        engine = EngineProcess(bpm=120)
+    else:
+        engine = SequencerEngine(bpm=120)
     engine.add_track(track1)
     engine.add_track(track2)
 
-    # default global MIDI out
-    midi_out = MIDIOutput()
-    engine.midi_output = midi_out
+    if not args.engine_process:
+        # default global MIDI out
+        midi_out = MIDIOutput()
+        engine.midi_output = midi_out
 
     root = tk.Tk()
     app = GridSequencerGUI(root, engine)
     root.mainloop()
 
-    midi_out.close()
+    if args.engine_process:
+        engine.close()
+    else:
+        midi_out.close()
 
 if __name__=="__main__":
     main()
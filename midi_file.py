@@ -0,0 +1,162 @@
+# midi_file.py
+
+import mmap
+from track import Track
+
+###################################
+# STREAMING SMF IMPORT
+###################################
+# Standard MIDI Files are walked byte by byte straight off an mmap: no
+# message objects, no per-track event lists. Each note-on is quantized the
+# moment it's read and written into per-channel bytearrays sized to the
+# grid, and Track objects are only built once at the end.
+
+def _read_vlq(data, pos):
+    value = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value = (value << 7) | (b & 0x7F)
+        if b < 0x80:
+            return value, pos
+
+class _ChannelGrid:
+    def __init__(self, step_count):
+        self.active = bytearray(step_count)
+        self.note = bytearray(b"\x3c"*step_count)  # 60, Track's default
+        self.velocity = bytearray(b"\x64"*step_count)  # 100
+        self.name = None
+
+    def grow(self, step_count):
+        extra = step_count - len(self.active)
+        if extra > 0:
+            self.active.extend(bytes(extra))
+            self.note.extend(b"\x3c"*extra)
+            self.velocity.extend(b"\x64"*extra)
+
+def import_midi_file(path, step_count=None, subdivisions=4, channels=None, fold=False):
+    """
+    Read a .mid file and return one Track per MIDI channel that has notes.
+
+    Notes are snapped to the nearest step of a grid with 'subdivisions'
+    steps per quarter note. With step_count=None the grid is as long as
+    the file; otherwise notes past the end are dropped, or wrapped onto
+    the pattern when fold=True. A step keeps its loudest note. 'channels'
+    optionally limits which channels (0-15, as used by Track.channel)
+    are imported.
+    """
+    if subdivisions <= 0:
+        raise ValueError(f"subdivisions must be positive, got {subdivisions}.")
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[0:4] != b"MThd" or len(data) < 14:
+                raise ValueError(f"{path} is not a Standard MIDI File.")
+            hdr_len = int.from_bytes(data[4:8], "big")
+            ntracks = int.from_bytes(data[10:12], "big")
+            division = int.from_bytes(data[12:14], "big")
+            if division & 0x8000:
+                raise ValueError("SMPTE time division is not supported.")
+            if division == 0:
+                raise ValueError(f"{path} has a zero time division.")
+            step_ticks = division/subdivisions
+            wanted = set(channels) if channels is not None else None
+
+            grids = {}
+            max_step = 0
+            initial_steps = step_count if step_count else 64
+            pos = 8 + hdr_len
+            try:
+                for _ in range(ntracks):
+                    if pos+8 > len(data):
+                        raise IndexError  # chunk header cut off
+                    chunk_type = data[pos:pos+4]
+                    chunk_len = int.from_bytes(data[pos+4:pos+8], "big")
+                    pos += 8
+                    end = pos + chunk_len
+                    if chunk_type != b"MTrk":
+                        pos = end
+                        continue
+
+                    tick = 0
+                    status = 0
+                    track_name = None
+                    while pos < end:
+                        delta = data[pos]
+                        if delta < 0x80:  # short deltas are the common case
+                            pos += 1
+                        else:
+                            delta, pos = _read_vlq(data, pos)
+                        tick += delta
+                        b = data[pos]
+                        if b >= 0x80:
+                            status = b
+                            pos += 1
+                        # else: running status, b is the first data byte
+
+                        if status == 0xFF:
+                            meta = data[pos]
+                            length, pos = _read_vlq(data, pos+1)
+                            if meta == 0x03 and track_name is None:
+                                track_name = data[pos:pos+length].decode("latin-1").strip()
+                            pos += length
+                            status = 0
+                            if meta == 0x2F:
+                                break
+                            continue
+                        if status in (0xF0, 0xF7):
+                            length, pos = _read_vlq(data, pos)
+                            pos += length
+                            status = 0
+                            continue
+
+                        kind = status & 0xF0
+                        if kind in (0xC0, 0xD0):
+                            pos += 1
+                            continue
+                        d1 = data[pos]
+                        d2 = data[pos+1]
+                        pos += 2
+                        if kind != 0x90 or d2 == 0:
+                            continue
+
+                        ch = status & 0x0F
+                        if wanted is not None and ch not in wanted:
+                            continue
+                        step = int(tick/step_ticks + 0.5)
+                        if step_count:
+                            if step >= step_count:
+                                if not fold:
+                                    continue
+                                step %= step_count
+                        grid = grids.get(ch)
+                        if grid is None:
+                            grid = grids[ch] = _ChannelGrid(initial_steps)
+                        if step >= len(grid.active):
+                            grid.grow(max(step+1, len(grid.active)*2))
+                        if not grid.active[step] or d2 > grid.velocity[step]:
+                            grid.active[step] = 1
+                            grid.note[step] = d1
+                            grid.velocity[step] = d2
+                        if grid.name is None:
+                            grid.name = track_name
+                        if step > max_step:
+                            max_step = step
+                    pos = end
+            except IndexError:
+                # a chunk or event ran past the end of the file
+                raise ValueError(f"{path} is truncated or corrupt.") from None
+
+    length = step_count if step_count else max_step+1
+    tracks = []
+    for ch in sorted(grids):
+        grid = grids[ch]
+        tr = Track(name=grid.name or f"Ch {ch}", step_count=length, channel=ch,
+                   subdivisions=subdivisions)
+        active, note, velocity = grid.active, grid.note, grid.velocity
+        for i, step_data in enumerate(tr.steps):
+            if i < len(active) and active[i]:
+                step_data["active"] = 1
+                step_data["note"] = note[i]
+                step_data["velocity"] = velocity[i]
+        tracks.append(tr)
+    return tracks
@@ -2,6 +2,103 @@
 
 import mido
 import time
+import threading
+
+###################################
+# TRANSPORT / CLOCK MESSAGES
+###################################
+# Built once: at 24 PPQN the clock-master loop sends these many times a second.
+MIDI_CLOCK_PPQN = 24
+CLOCK_MSG = mido.Message('clock')
+START_MSG = mido.Message('start')
+STOP_MSG = mido.Message('stop')
+
+def song_position_msg(sixteenths):
+    """
+    Song Position Pointer, counted in MIDI beats (sixteenth notes).
+    """
+    return mido.Message('songpos', pos=max(0, min(16383, int(sixteenths))))
+
+###################################
+# IN-PROCESS VIRTUAL PORTS
+###################################
+# Any port name starting with VIRTUAL_PREFIX is served from memory instead
+# of the OS MIDI layer, e.g. MIDIOutput("virtual:bench"). An output and an
+# input opened on the same name are looped back to each other.
+VIRTUAL_PREFIX = "virtual:"
+VIRTUAL_CAPACITY = 65536
+
+_virtual_ports = {}
+_virtual_lock = threading.Lock()
+
+class VirtualPort:
+    """
+    Records every sent message with its perf_counter timestamp into a
+    preallocated ring buffer, and forwards it to an input callback if one
+    is attached. Once full, the oldest entries are overwritten.
+    """
+    def __init__(self, name, capacity=VIRTUAL_CAPACITY):
+        self.name = name
+        self.capacity = capacity
+        self._times = [0.0]*capacity
+        self._msgs = [None]*capacity
+        self.count = 0  # total messages ever sent
+        self.callback = None
+        # engine loop, clock and note-off timers all send concurrently
+        self._lock = threading.Lock()
+
+    def send(self, msg):
+        now = time.perf_counter()
+        with self._lock:
+            slot = self.count % self.capacity
+            self._times[slot] = now
+            self._msgs[slot] = msg
+            self.count += 1
+        cb = self.callback
+        if cb:
+            cb(msg)
+
+    def messages(self):
+        """
+        Return the buffered (timestamp, msg) pairs, oldest first.
+        """
+        with self._lock:
+            count = self.count
+            n = min(count, self.capacity)
+            out = []
+            for k in range(count-n, count):
+                slot = k % self.capacity
+                out.append((self._times[slot], self._msgs[slot]))
+        return out
+
+    def clear(self):
+        with self._lock:
+            self.count = 0
+
+    def close(self):
+        # Ports live in the registry so the buffer survives the engine's
+        # open/close-per-note usage. MIDIInput detaches its own callback.
+        pass
+
+
+def is_virtual_port(port_name):
+    return isinstance(port_name, str) and port_name.startswith(VIRTUAL_PREFIX)
+
+def get_virtual_port(port_name, capacity=VIRTUAL_CAPACITY):
+    """
+    Fetch the named virtual port, creating it on first use.
+    """
+    with _virtual_lock:
+        port = _virtual_ports.get(port_name)
+        if port is None:
+            port = VirtualPort(port_name, capacity)
+            _virtual_ports[port_name] = port
+        return port
+
+def remove_virtual_port(port_name):
+    with _virtual_lock:
+        _virtual_ports.pop(port_name, None)
+
 
 class MIDIOutput:
     def __init__(self, port_name=None):
@@ -10,9 +107,16 @@ class MIDIOutput:
             if not outs:
                 raise ValueError("No MIDI output ports available.")
             port_name=outs[0]
-        self.port = mido.open_output(port_name)
+        self.port_name = port_name
+        if is_virtual_port(port_name):
+            self.port = get_virtual_port(port_name)
+        else:
+            self.port = mido.open_output(port_name)
         print(f"[MIDIOutput] Opened {port_name}")
 
+    def send(self, msg):
+        self.port.send(msg)
+
     def note_on(self, note, velocity=100, channel=1):
         self.port.send(mido.Message('note_on', note=note, velocity=velocity, channel=channel))
 
@@ -23,6 +127,29 @@ class MIDIOutput:
         self.port.close()
 
 
+class MIDIFanOut:
+    """
+    Drop-in for MIDIOutput that mirrors every message to several outputs.
+    Each message is built once and sent to all destinations in order.
+    """
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+
+    def send(self, msg):
+        for out in self.outputs:
+            out.send(msg)
+
+    def note_on(self, note, velocity=100, channel=1):
+        self.send(mido.Message('note_on', note=note, velocity=velocity, channel=channel))
+
+    def note_off(self, note, velocity=100, channel=1):
+        self.send(mido.Message('note_off', note=note, velocity=velocity, channel=channel))
+
+    def close(self):
+        for out in self.outputs:
+            out.close()
+
+
 class MIDIInput:
     def __init__(self, engine, port_name=None, ticks_per_quarter=24):
         self.engine=engine
@@ -34,13 +161,23 @@ class MIDIInput:
                 raise ValueError("No MIDI input ports found.")
             port_name=ins[0]
 
-        self.port=mido.open_input(port_name, callback=self.on_midi_in)
+        if is_virtual_port(port_name):
+            self.port=get_virtual_port(port_name)
+            self.port.callback=self.on_midi_in
+        else:
+            self.port=mido.open_input(port_name, callback=self.on_midi_in)
         self.last_tick_time=None
         self.clock_intervals=[]
         print(f"[MIDIInput] Listening on {port_name}")
 
     def on_midi_in(self, msg):
-        if msg.type=='clock':
+        if msg.type in ('note_on','note_off'):
+            # Runs on mido's callback thread: stamp and hand off, nothing more.
+            # The engine quantizes and merges at the next cycle boundary.
+            if self.engine.record_track_idx is not None:
+                self.engine.record_queue.append(
+                    (time.perf_counter(), msg.type, msg.note, msg.velocity))
+        elif msg.type=='clock':
             self.handle_clock()
         elif msg.type in ('start','continue'):
             self.engine.start()
@@ -63,4 +200,6 @@ class MIDIInput:
             self.engine.set_bpm(new_bpm)
 
     def close(self):
+        if isinstance(self.port, VirtualPort):
+            self.port.callback=None
         self.port.close()
@@ -0,0 +1,254 @@
+# tracelog.py
+
+import struct
+import time
+from collections import namedtuple
+
+###################################
+# FILE FORMAT
+###################################
+# 8-byte magic, then fixed 28-byte little-endian records:
+#   intended time (f64, s since engine start)
+#   actual send time (f64, s since engine start)
+#   track index (i32, -1 for clock/transport)
+#   step index (i32, clock tick count for clock messages)
+#   status, data1, data2 (u8 each) + 1 pad byte
+# Each engine start writes a run-start record (status 0x00, track -1,
+# step = run number) and record times are measured from that start, so
+# one log can hold several Play/Stop runs.
+TRACE_MAGIC = b"PSQTRC01"
+RECORD = struct.Struct("<ddiiBBBx")
+
+TraceRecord = namedtuple("TraceRecord",
+    ["intended","actual","track","step","status","data1","data2"])
+
+STATUS_RUN_START = 0x00  # not a MIDI status; marks a new run in the log
+STATUS_NOTE_OFF = 0x80
+STATUS_NOTE_ON = 0x90
+STATUS_SONGPOS = 0xF2
+STATUS_CLOCK = 0xF8
+STATUS_START = 0xFA
+STATUS_STOP = 0xFC
+
+class TraceRecorder:
+    """
+    Appends one fixed-size record per emitted MIDI message. Writes go
+    through a BufferedWriter, so the engine loop only pays for a struct
+    pack and a memcpy; the OS sees one write per buffer_size bytes.
+    """
+    def __init__(self, path, buffer_size=1<<16):
+        self.path = path
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.file.write(TRACE_MAGIC)
+        self.start_time = time.perf_counter()
+        self.runs = 0
+
+    def begin(self, start_time):
+        """
+        Start a new run: write its run-start record and measure the times
+        that follow from start_time (a perf_counter value).
+        """
+        self.start_time = start_time
+        self.record(start_time, start_time, -1, self.runs, STATUS_RUN_START)
+        self.runs += 1
+
+    def record(self, intended, actual, track_idx, step_idx, status, data1=0, data2=0):
+        t0 = self.start_time
+        self.file.write(RECORD.pack(intended-t0, actual-t0, track_idx, step_idx,
+                                    status & 0xFF, data1 & 0x7F, data2 & 0x7F))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+###################################
+# READING / REPLAY / DIFF
+###################################
+def read_trace(path, run=None, chunk_records=4096):
+    """
+    Stream TraceRecords from a log without loading the whole file. With
+    run=None every record is yielded, run-start records included;
+    otherwise only the messages of that run (0 = the first).
+    """
+    current = -1
+    with open(path, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a trace log.")
+        while True:
+            chunk = f.read(RECORD.size*chunk_records)
+            if not chunk:
+                break
+            usable = len(chunk) - len(chunk) % RECORD.size  # ignore a torn tail
+            for fields in RECORD.iter_unpack(chunk[:usable]):
+                rec = TraceRecord(*fields)
+                if run is None:
+                    yield rec
+                    continue
+                if is_run_start(rec):
+                    current += 1
+                    if current > run:
+                        return
+                elif max(current, 0) == run:  # records before any marker: run 0
+                    yield rec
+            if usable < len(chunk):
+                break
+
+def count_runs(path):
+    return sum(1 for rec in read_trace(path) if is_run_start(rec))
+
+def record_bytes(rec):
+    if rec.status in (STATUS_CLOCK, STATUS_START, STATUS_STOP):
+        return [rec.status]
+    return [rec.status, rec.data1, rec.data2]
+
+def is_run_start(rec):
+    return rec.status == STATUS_RUN_START
+
+def is_note(rec):
+    return STATUS_NOTE_OFF <= rec.status < 0xA0
+
+def replay_trace(path, output, speed=1.0, notes_only=False, run=None):
+    """
+    Re-send a trace to a MIDIOutput at its original intended times: one
+    run, or with run=None all of them back to back.
+    """
+    import mido
+    start = time.perf_counter()
+    for rec in read_trace(path, run):
+        if is_run_start(rec):
+            start = time.perf_counter()  # times restart from 0 each run
+            continue
+        if notes_only and not is_note(rec):
+            continue
+        due = start + rec.intended/speed
+        wait = due - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        output.send(mido.Message.from_bytes(record_bytes(rec)))
+
+def latency_stats(records):
+    """
+    (count, mean, max) of actual-intended send lateness, in seconds.
+    """
+    n = 0
+    total = 0.0
+    worst = 0.0
+    for rec in records:
+        if is_run_start(rec):
+            continue
+        late = rec.actual - rec.intended
+        n += 1
+        total += late
+        if late > worst:
+            worst = late
+    return n, (total/n if n else 0.0), worst
+
+def diff_traces(path_a, path_b, notes_only=True, run_a=0, run_b=0):
+    """
+    Pair up messages of two runs (run_a of one log, run_b of the other,
+    which may be the same file) by (track, step, status, data1) in order
+    of appearance. Returns (deltas, missing, extra): deltas is a list of
+    (record_a, record_b, actual_b - actual_a); missing are records only
+    in A, extra only in B.
+    """
+    def keyed(path, run):
+        groups = {}
+        for rec in read_trace(path, run):
+            if notes_only and not is_note(rec):
+                continue
+            groups.setdefault((rec.track, rec.step, rec.status, rec.data1), []).append(rec)
+        return groups
+
+    groups_a = keyed(path_a, run_a)
+    groups_b = keyed(path_b, run_b)
+    deltas = []
+    missing = []
+    extra = []
+    for key in groups_a.keys() | groups_b.keys():
+        recs_a = groups_a.get(key, [])
+        recs_b = groups_b.get(key, [])
+        for ra, rb in zip(recs_a, recs_b):
+            deltas.append((ra, rb, rb.actual-ra.actual))
+        missing.extend(recs_a[len(recs_b):])
+        extra.extend(recs_b[len(recs_a):])
+    deltas.sort(key=lambda d: d[0].intended)
+    missing.sort(key=lambda r: r.intended)
+    extra.sort(key=lambda r: r.intended)
+    return deltas, missing, extra
+
+def format_record(rec):
+    if is_run_start(rec):
+        return f"---- run {rec.step} ----"
+    return (f"{rec.intended*1000:10.3f}ms  +{(rec.actual-rec.intended)*1000:7.3f}ms  "
+            f"trk {rec.track:3d}  step {rec.step:5d}  "
+            f"{' '.join(f'{b:02X}' for b in record_bytes(rec))}")
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect, replay and diff engine trace logs.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_show = sub.add_parser("show", help="print every record and latency stats")
+    p_show.add_argument("trace")
+    p_show.add_argument("--run", type=int, default=None, help="only this run (0 = first)")
+
+    p_replay = sub.add_parser("replay", help="re-send a trace to a MIDI output")
+    p_replay.add_argument("trace")
+    p_replay.add_argument("--port", default=None)
+    p_replay.add_argument("--speed", type=float, default=1.0)
+    p_replay.add_argument("--notes-only", action="store_true")
+    p_replay.add_argument("--run", type=int, default=None, help="only this run (0 = first)")
+
+    p_diff = sub.add_parser("diff", help="compare two traces")
+    p_diff.add_argument("trace_a")
+    p_diff.add_argument("trace_b", nargs="?", default=None,
+                        help="defaults to trace_a, to compare two runs of one log")
+    p_diff.add_argument("--run-a", type=int, default=0)
+    p_diff.add_argument("--run-b", type=int, default=None,
+                        help="defaults to 0, or 1 when diffing a log against itself")
+    p_diff.add_argument("--include-clock", action="store_true")
+    p_diff.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.cmd == "show":
+        for rec in read_trace(args.trace, args.run):
+            print(format_record(rec))
+        n, mean, worst = latency_stats(read_trace(args.trace, args.run))
+        print(f"{n} messages, mean late {mean*1000:.3f}ms, worst {worst*1000:.3f}ms")
+    elif args.cmd == "replay":
+        from midi_io import MIDIOutput
+        out = MIDIOutput(args.port)
+        try:
+            replay_trace(args.trace, out, args.speed, args.notes_only, args.run)
+        finally:
+            out.close()
+    elif args.cmd == "diff":
+        trace_b = args.trace_b or args.trace_a
+        run_b = args.run_b
+        if run_b is None:
+            run_b = 0 if args.trace_b else 1
+        deltas, missing, extra = diff_traces(args.trace_a, trace_b,
+                                             notes_only=not args.include_clock,
+                                             run_a=args.run_a, run_b=run_b)
+        for label, path, run in (("A", args.trace_a, args.run_a), ("B", trace_b, run_b)):
+            n, mean, worst = latency_stats(read_trace(path, run))
+            print(f"{label}: {path} run {run} of {count_runs(path)}: {n} messages, "
+                  f"mean late {mean*1000:.3f}ms, worst {worst*1000:.3f}ms")
+        if deltas:
+            abs_d = sorted(abs(d[2]) for d in deltas)
+            print(f"matched {len(deltas)}: median |delta| {abs_d[len(abs_d)//2]*1000:.3f}ms, "
+                  f"max {abs_d[-1]*1000:.3f}ms")
+            for ra, rb, d in sorted(deltas, key=lambda d: -abs(d[2]))[:args.limit]:
+                print(f"  {d*1000:+8.3f}ms  {format_record(ra)}")
+        print(f"missing in B: {len(missing)}")
+        for rec in missing[:args.limit]:
+            print(f"  - {format_record(rec)}")
+        print(f"extra in B: {len(extra)}")
+        for rec in extra[:args.limit]:
+            print(f"  + {format_record(rec)}")
+
+if __name__=="__main__":
+    main()
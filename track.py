@@ -1,6 +1,7 @@
 # track.py
 
 import random
+from collections import namedtuple
 
 ###################################
 # NOTE NAME MAPPING
@@ -31,6 +32,19 @@ def midi_to_note_name(midi_num: int) -> str:
         base = len(NOTE_NAMES) - 1
     return NOTE_NAMES[base]
 
+###################################
+# TRACK SNAPSHOT
+###################################
+# Immutable copy of a track as the engine plays it. 'track' points back at
+# the editable Track it was taken from, 'steps' is a tuple of
+# (active, note, velocity) tuples. 'ca_rows' is None, or a tuple of
+# bit-packed generations the engine steps through one per cycle (bit i of
+# a row is step i's active flag, overriding steps[i][0]); 'ca_base' is the
+# generation number of ca_rows[0].
+TrackSnapshot = namedtuple("TrackSnapshot",
+    ["track","channel","step_count","subdivisions","midi_output_device","steps","ca_rows",
+     "ca_base"])
+
 ###################################
 # TRACK CLASS
 ###################################
@@ -51,6 +65,13 @@ class Track:
         # Optional per-track MIDI device (string name)
         self.midi_output_device = None
 
+        # Precomputed automaton generations for "rule_based" (see
+        # precompute_rule_rows); None means play self.steps as-is. It's a
+        # window that advance_ca_rows() slides forward as the engine plays:
+        # ca_rows[0] is generation ca_base.
+        self.ca_rows = None
+        self.ca_base = 0
+
         self.steps = []
         for _ in range(step_count):
             self.steps.append({"active":0, "note":60, "velocity":100})
@@ -66,13 +87,44 @@ class Track:
             else:
                 self.steps.append({"active":0, "note":60, "velocity":100})
         self.step_count = new_count
+        self.ca_rows = None
+
+    def snapshot(self):
+        """
+        Freeze the current state into a TrackSnapshot for the engine.
+        """
+        steps = tuple((s["active"], s["note"], s["velocity"]) for s in self.steps)
+        return TrackSnapshot(self, self.channel, len(steps), self.subdivisions,
+                             self.midi_output_device, steps, self.ca_rows, self.ca_base)
 
     def toggle_step(self, index):
         if 0 <= index < self.step_count:
             self.steps[index]["active"] = 1 - self.steps[index]["active"]
+            # a hand edit freezes the automaton until the next generate
+            self.ca_rows = None
+
+    def advance_ca_rows(self, gen):
+        """
+        Slide the automaton window so it starts at generation 'gen' (the
+        one playing), computing as many new generations past its end as
+        are dropped from the front. Returns whether anything changed.
+        """
+        rows = self.ca_rows
+        drop = gen - self.ca_base
+        if not rows or drop <= 0:
+            return False
+        drop = min(drop, len(rows)-1)  # keep at least the playing row
+        rule_name = self.generative_params.get("rule_name","simple")
+        new_rows = precompute_rule_rows(rows[-1], self.step_count, rule_name,
+                                        self.generative_params, drop+1)
+        self.ca_rows = rows[drop:] + new_rows[1:]
+        self.ca_base += drop
+        return True
 
     def generate_pattern(self, reference_track=None):
         algo = self.algorithm
+        self.ca_rows = None
+        self.ca_base = 0
         if algo == "euclidean":
             pulses = self.generative_params.get("pulses",4)
             pat = generate_euclidean(self.step_count, pulses)
@@ -90,9 +142,13 @@ class Track:
         elif algo == "rule_based":
             rule_name = self.generative_params.get("rule_name","simple")
             old_pat = [s["active"] for s in self.steps]
-            new_pat = generate_rule_based(old_pat, rule_name)
+            new_pat = generate_rule_based(old_pat, rule_name, self.generative_params)
             for i,val in enumerate(new_pat):
                 self.steps[i]["active"] = val
+            if rule_name in ("elementary","totalistic"):
+                gens = max(2, _int_param(self.generative_params, "generations", 64))
+                self.ca_rows = precompute_rule_rows(pack_row(new_pat), self.step_count,
+                                                    rule_name, self.generative_params, gens)
         elif algo == "counterpoint":
             generate_species_counterpoint(self, reference_track, self.generative_params)
         else:
@@ -142,12 +198,131 @@ def generate_markov(steps:int, matrix=None)->list:
                 break
     return pat
 
-def generate_rule_based(pat_in:list, rule_name:str)->list:
+###################################
+# CELLULAR AUTOMATA (bit-packed)
+###################################
+# A row is a Python int with bit i = step i, wrapping at the track length.
+# One generation is a handful of shifts/ands/ors over the whole row, so a
+# 1024-step track costs the same few dozen big-int ops as a 16-step one.
+
+def pack_row(pat:list)->int:
+    row=0
+    for i,val in enumerate(pat):
+        if val:
+            row|=1<<i
+    return row
+
+def unpack_row(row:int, n:int)->list:
+    return [(row>>i)&1 for i in range(n)]
+
+def _rotate(row:int, k:int, n:int, full:int)->int:
+    # value at bit i becomes the old value at bit i-k (mod n)
+    k%=n
+    if k==0:
+        return row
+    return ((row<<k)|(row>>(n-k)))&full
+
+def ca_step_elementary(row:int, n:int, rule:int)->int:
+    """
+    One generation of Wolfram elementary rule 0-255 on a ring of n cells.
+    """
+    full=(1<<n)-1
+    left=_rotate(row, 1, n, full)    # cell i-1
+    right=_rotate(row, -1, n, full)  # cell i+1
+    nleft, ncent, nright = ~left&full, ~row&full, ~right&full
+    out=0
+    for pattern in range(8):
+        if (rule>>pattern)&1:
+            out|=((left if pattern&4 else nleft)
+                  &(row if pattern&2 else ncent)
+                  &(right if pattern&1 else nright))
+    return out
+
+def ca_step_totalistic(row:int, n:int, code:int, radius:int=1)->int:
+    """
+    One generation of a totalistic rule: a cell is on next if bit k of
+    'code' is set, where k is the number of on cells within 'radius'
+    (itself included). Neighborhood sums are counted bit-sliced: each
+    plane holds one binary digit of every cell's count.
+    """
+    full=(1<<n)-1
+    planes=[]
+    for off in range(-radius, radius+1):
+        carry=_rotate(row, off, n, full)
+        for j in range(len(planes)):
+            planes[j], carry = planes[j]^carry, planes[j]&carry
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    out=0
+    for k in range(2*radius+2):
+        if not (code>>k)&1:
+            continue
+        if k>>len(planes):
+            continue  # count too high to ever be reached
+        match=full
+        for j,plane in enumerate(planes):
+            match&=plane if (k>>j)&1 else ~plane&full
+        out|=match
+    return out
+
+def _int_param(params:dict, key:str, default:int)->int:
+    # values come from a free-text field: anything non-numeric => default
+    try:
+        return int(params.get(key, default))
+    except (TypeError, ValueError, OverflowError):
+        return default
+
+def ca_step(row:int, n:int, rule_name:str, params:dict)->int:
+    if rule_name=="totalistic":
+        return ca_step_totalistic(row, n, _int_param(params, "code", 20),
+                                  max(0, _int_param(params, "radius", 1)))
+    return ca_step_elementary(row, n, _int_param(params, "rule", 30)&0xFF)
+
+def precompute_rule_rows(row:int, n:int, rule_name:str, params:dict, generations:int=64)->tuple:
+    """
+    The current row followed by the next generations-1, for the engine to
+    step through one per cycle.
+    """
+    rows=[row]
+    for _ in range(max(0, generations-1)):
+        row=ca_step(row, n, rule_name, params)
+        rows.append(row)
+    return tuple(rows)
+
+def refill_ca_rows(tracks:list, gens:dict, apply_edit)->None:
+    """
+    For each track that has played through half its ca_rows window
+    (gens[track_idx] is the generation playing), slide the window to the
+    playing generation via apply_edit(track_idx, edit). The engine's
+    timing loop never computes rows; if a refill is late it holds on the
+    last row rather than wrapping back to the first.
+    """
+    for t_idx, gen in gens.items():
+        if t_idx>=len(tracks):
+            continue
+        track=tracks[t_idx]
+        rows=track.ca_rows
+        if rows and gen-track.ca_base>=len(rows)//2:
+            apply_edit(t_idx, lambda tr, gen=gen, rows=rows:
+                       tr.ca_rows is rows and tr.advance_ca_rows(gen))
+
+def generate_rule_based(pat_in:list, rule_name:str, params:dict=None)->list:
+    params=params or {}
     out=pat_in[:]
     if rule_name=="simple":
         for i in range(len(out)):
             if i%2==0:
                 out[i]=1-out[i]
+    elif rule_name in ("elementary","totalistic"):
+        n=len(out)
+        if n<1:
+            return out
+        row=pack_row(out)
+        if row==0:
+            row=1<<(n//2)  # seed a single cell so the rule has something to grow
+        out=unpack_row(ca_step(row, n, rule_name, params), n)
     return out
 
 def generate_species_counterpoint(target_track, reference_track, params):